@@ -8,7 +8,8 @@ from dotenv import load_dotenv
 
 from db import init_collection
 from crawl import crawl_website
-from utils import get_db_stats, query_rag_system
+from services import close_session
+from utils import finalize_answer, get_db_stats, query_rag_system, warmup
 
 # Load environment variables
 load_dotenv()
@@ -62,11 +63,16 @@ def initialize_session_state():
         st.session_state.crawl_status = ""
     if "stats" not in st.session_state:
         st.session_state.stats = None # Or an empty dict: {"doc_count": 0, "urls": [], "domains": [], "last_updated": "N/A"}
+    if "warmed" not in st.session_state:
+        st.session_state.warmed = False
 
 async def initialize_async_session_state():
     """Initialize parts of session state that require async operations."""
     if st.session_state.stats is None: # Only fetch if not already populated
         st.session_state.stats = await get_db_stats(collection)
+    if not st.session_state.warmed: # Load models and index before the first question
+        await warmup(collection)
+        st.session_state.warmed = True
 
 
 async def render_chat():
@@ -106,26 +112,32 @@ async def render_chat():
                 
                 # Query the RAG system, now passing chat_history
                 result = await query_rag_system(collection, query, chat_history=chat_history_for_rag)
-                answer = result["answer"]
                 sources = result["sources"]
-                
-                st.markdown(answer)
-                
-                # Display sources if available
-                if sources:
-                    with st.expander("View sources"):
-                        for source in sources:
-                            st.markdown(f"**{source['title']}**")
-                            st.markdown(f"URL: [{source['url']}]({source['url']})")
-                            st.markdown(f"Summary: {source['summary']}")
-                            st.divider()
-                
-                # Add to session state
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": answer,
-                    "sources": sources
-                })
+            
+            # Paint the answer as it streams in, then replace it with the cleaned-up version
+            answer_placeholder = st.empty()
+            raw_answer = ""
+            async for text in result["answer_stream"]:
+                raw_answer += text
+                answer_placeholder.markdown(raw_answer + "▌")
+            answer = finalize_answer(raw_answer)
+            answer_placeholder.markdown(answer)
+            
+            # Display sources if available
+            if sources:
+                with st.expander("View sources"):
+                    for source in sources:
+                        st.markdown(f"**{source['title']}**")
+                        st.markdown(f"URL: [{source['url']}]({source['url']})")
+                        st.markdown(f"Summary: {source['summary']}")
+                        st.divider()
+            
+            # Add to session state
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": answer,
+                "sources": sources
+            })
 
 
 async def sidebar_crawl_controls():
@@ -188,11 +200,15 @@ async def sidebar_crawl_controls():
 
 async def main():
     """Main application function."""
-    initialize_session_state()
-    await initialize_async_session_state()
-    
-    await sidebar_crawl_controls()
-    await render_chat()
+    try:
+        initialize_session_state()
+        await initialize_async_session_state()
+
+        await sidebar_crawl_controls()
+        await render_chat()
+    finally:
+        # Every rerun gets a new event loop; close its pooled session before the loop goes
+        await close_session()
 
 
 if __name__ == "__main__":
@@ -1,34 +1,61 @@
 import os
-import json
+import re
+import time
 import asyncio
-from bs4 import BeautifulSoup
+import aiohttp
+import orjson
+from bisect import bisect_right
+from selectolax.lexbor import LexborHTMLParser
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from urllib.parse import urlparse, urljoin
-import aiohttp
 from dotenv import load_dotenv
 
-from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from db.stats import record_added
+from utils.dedup import DedupIndex, get_dedup_index, save_dedup_index
+from utils.faiss_store import add_to_store, save_store
+from services.embeddings import EMBEDDING_BACKEND, embed_texts, normalize
+from services.http_client import close_session, get_session
+from services.ollama import embed_one, generate
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Ollama models
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-m3")
+# Texts per embedding request
+OLLAMA_EMBED_BATCH = int(os.getenv("OLLAMA_EMBED_BATCH", "32"))
+
+# Chunks buffered per ChromaDB add during a crawl
+INSERT_BATCH_SIZE = 250
+
+# Crawl worker tasks, and how many of them may fetch from the site at once
+CRAWL_WORKERS = 10
+MAX_CONCURRENT_FETCHES = 4
 
-# Initialize LLM
-llm = OllamaLLM(model=LLM_MODEL, base_url=OLLAMA_HOST, temperature=0.1)
+# Per-page fetch limits; sock_read bounds stalls between reads from slow servers
+FETCH_TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=5, sock_read=20)
 
-# Initialize embeddings
-embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL, base_url=OLLAMA_HOST)
+# Page requests only; the shared session also talks to the Ollama/Infinity JSON APIs.
+# aiohttp already sends Accept-Encoding: gzip, deflate and keeps connections alive.
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; rag_web-crawler/1.0)",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+}
+
+# Chunk break patterns; the lookahead also matches overlapping runs like "\n\n\n"
+_PARAGRAPH_BREAK = re.compile(r"(?=\n\n)")
+_SENTENCE_BREAK = re.compile(r"\. ")
+
+# Outermost {...} in an LLM reply, ignoring any text the model put around it
+_JSON_OBJECT = re.compile(rb"\{.*\}", re.S)
 
 
 @dataclass
 class ProcessedChunk:
     """Represents a processed text chunk with metadata and embedding."""
+    # Python 3.9 has no dataclass(slots=True); no field has a default, so plain __slots__ works
+    __slots__ = ("url", "chunk_number", "title", "summary", "content", "metadata", "embedding")
+
     url: str
     chunk_number: int
     title: str
@@ -40,6 +67,11 @@ class ProcessedChunk:
 
 def chunk_text(text: str, chunk_size: int = 1500) -> List[str]:
     """Split text into chunks, respecting paragraphs."""
+    # Find break positions once for the whole text, then bisect per chunk
+    paragraph_starts = [m.start() for m in _PARAGRAPH_BREAK.finditer(text)]
+    sentence_starts = [m.start() for m in _SENTENCE_BREAK.finditer(text)]
+    min_offset = chunk_size * 0.3
+
     chunks = []
     start = 0
     text_length = len(text)
@@ -50,16 +82,18 @@ def chunk_text(text: str, chunk_size: int = 1500) -> List[str]:
             chunks.append(text[start:].strip())
             break
 
-        chunk = text[start:end]
+        # Last break that fits entirely inside text[start:end]
+        i = bisect_right(paragraph_starts, end - 2) - 1
+        paragraph_break = paragraph_starts[i] - start if i >= 0 else -1
+        j = bisect_right(sentence_starts, end - 2) - 1
+        last_period = sentence_starts[j] - start if j >= 0 else -1
+
         # Try to break at paragraph
-        paragraph_break = chunk.rfind("\n\n")
-        if paragraph_break > chunk_size * 0.3:
+        if paragraph_break > min_offset:
             end = start + paragraph_break + 2
         # Or try sentence break
-        elif ". " in chunk:
-            last_period = chunk.rfind(". ")
-            if last_period > chunk_size * 0.3:
-                end = start + last_period + 1
+        elif last_period > min_offset:
+            end = start + last_period + 1
 
         chunk = text[start:end].strip()
         if chunk:
@@ -69,37 +103,36 @@ def chunk_text(text: str, chunk_size: int = 1500) -> List[str]:
     return chunks
 
 
-async def get_title_and_content(chunk: str, url: str) -> Dict[str, str]:
-    """Extract a title using Ollama LLM and return the original chunk as content."""
+async def get_title_and_content(chunk: str, url: str, netloc: str, page_title: str = "") -> Dict[str, str]:
+    """Title a chunk and return the original chunk as content.
+
+    Uses page_title when the page had one and only asks the Ollama LLM otherwise.
+    """
+    if page_title:
+        return {
+            "title": page_title,
+            "summary": chunk
+        }
+
     system_prompt = """วิเคราะห์เนื้อหาต่อไปนี้และสร้างชื่อเรื่องที่กระชับ (ไม่เกิน 10-15 คำ) เป็นภาษาไทย
     ชื่อเรื่องควรจับใจความสำคัญของเนื้อหา
     ตอบกลับเป็น JSON เท่านั้น โดยมีคีย์ 'title'
     ตัวอย่าง: {"title": "วิธีการดูแลผู้ป่วยโรคเบาหวาน"}
     ห้ามใส่คำอธิบายหรือข้อความอื่นใดนอกจาก JSON"""
 
-    title = f"เนื้อหาจาก {urlparse(url).netloc}"
+    title = f"เนื้อหาจาก {netloc}"
     try:
-        loop = asyncio.get_event_loop()
         prompt_for_title = f"{system_prompt}\n\nเนื้อหา:\n{chunk[:1500]}..."
-        
-        response = await loop.run_in_executor(None, lambda: llm.invoke(prompt_for_title))
-        
-        json_str = response.strip()
-        if not json_str.startswith('{'):
-            start = json_str.find('{')
-            if start >= 0:
-                json_str = json_str[start:]
-            else:
-                print(f"Warning: No JSON found in title generation response for {url}. Raw: {response}")
-        
-        if json_str.startswith('{') and json_str.endswith('}'):
+        response = await generate(prompt_for_title, options={"temperature": 0.1})
+
+        match = _JSON_OBJECT.search(response.encode("utf-8"))
+        if match:
             try:
-                extracted_json = json.loads(json_str)
-                title = extracted_json.get("title", title)
-            except json.JSONDecodeError as e:
-                print(f"Warning: JSONDecodeError for title generation on {url}: {e}. Raw: {json_str}")
+                title = orjson.loads(match.group(0)).get("title", title)
+            except orjson.JSONDecodeError as e:
+                print(f"Warning: JSONDecodeError for title generation on {url}: {e}. Raw: {response}")
         else:
-            print(f"Warning: Malformed JSON for title generation on {url}. Raw: {json_str}")
+            print(f"Warning: No JSON found in title generation response for {url}. Raw: {response}")
 
     except Exception as e:
         print(f"Error getting title: {e}. Using default title for {url}.")
@@ -111,87 +144,233 @@ async def get_title_and_content(chunk: str, url: str) -> Dict[str, str]:
 
 
 async def get_embedding(text: str) -> List[float]:
-    """Get embedding vector from Ollama asynchronously."""
+    """Get embedding vector for one text; on Ollama, via the legacy single-text /api/embeddings endpoint."""
     try:
-        # Use aembed_query if available and it's a native async method
-        result = await embeddings.aembed_query(text) 
-        return result
+        if EMBEDDING_BACKEND != "ollama":
+            return (await embed_texts([text]))[0]
+        return normalize([await embed_one(text)])[0]
     except Exception as e:
         print(f"Error getting embedding for text snippet: {text[:100]}... Error: {e}")
         default_dim = 1024 
-        try:
-            if hasattr(embeddings, 'client') and hasattr(embeddings.client, 'show'): # Check for Ollama specific client details
-                pass # Placeholder if direct dim query is not straightforward
-        except:
-            pass # Ignore errors trying to get a more specific dimension
         return [0.0] * default_dim
 
 
-async def process_chunk(chunk: str, chunk_number: int, url: str) -> ProcessedChunk:
+async def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """Get embedding vectors for many texts, OLLAMA_EMBED_BATCH texts per backend request."""
+    vectors = []
+    for start in range(0, len(texts), OLLAMA_EMBED_BATCH):
+        batch = texts[start:start + OLLAMA_EMBED_BATCH]
+        batch_vectors = None
+        try:
+            batch_vectors = await embed_texts(batch)
+        except Exception as e:
+            print(f"Error getting batch embeddings ({len(batch)} texts): {e}")
+
+        if not batch_vectors or len(batch_vectors) != len(batch):
+            # Older Ollama servers lack /api/embed; fall back to one request per text
+            batch_vectors = await asyncio.gather(*(get_embedding(text) for text in batch))
+        vectors.extend(batch_vectors)
+    return vectors
+
+
+async def process_chunk(
+    chunk: str,
+    chunk_number: int,
+    url: str,
+    netloc: str,
+    path: str,
+    crawled_at: str,
+    embedding: List[float],
+    page_title: str = "",
+) -> ProcessedChunk:
     """Process a single chunk of text."""
-    extracted_data = await get_title_and_content(chunk, url)
-    embedding = await get_embedding(chunk)
+    extracted_data = await get_title_and_content(chunk, url, netloc, page_title)
+    title = extracted_data["title"]
+    summary = extracted_data["summary"]
 
+    # The complete ChromaDB metadata record, so inserts can pass it through as-is
     metadata = {
-        "source": urlparse(url).netloc,
+        "url": url,
+        "chunk_number": chunk_number,
+        "title": title,
+        "summary": summary,
+        "source": netloc,
         "chunk_size": len(chunk),
-        "crawled_at": datetime.now(timezone.utc).isoformat(),
-        "url_path": urlparse(url).path,
+        "crawled_at": crawled_at,
+        "url_path": path,
     }
 
     return ProcessedChunk(
         url=url,
         chunk_number=chunk_number,
-        title=extracted_data["title"],
-        summary=extracted_data["summary"],
+        title=title,
+        summary=summary,
         content=chunk,
         metadata=metadata,
         embedding=embedding,
     )
 
 
-async def insert_chunk(collection, chunk: ProcessedChunk):
-    """Insert a processed chunk into ChromaDB asynchronously."""
+async def insert_chunks(collection, chunks: List[ProcessedChunk], dedup: Optional[DedupIndex] = None) -> int:
+    """Insert processed chunks into ChromaDB with a single batched add.
+
+    With a DedupIndex, fingerprints are kept only for the chunks that were stored.
+    """
+    if not chunks:
+        return 0
+
+    documents = [chunk.content for chunk in chunks]
+    embeddings_batch = [chunk.embedding for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    ids = [f"{chunk.url}_{chunk.chunk_number}" for chunk in chunks]
+
+    loop = asyncio.get_event_loop()
     try:
-        loop = asyncio.get_event_loop()
         await loop.run_in_executor(
             None, # Use default ThreadPoolExecutor
             lambda: collection.add(
-                documents=[chunk.content],
-                embeddings=[chunk.embedding],
-                metadatas=[
-                    {
-                        "url": chunk.url,
-                        "chunk_number": chunk.chunk_number,
-                        "title": chunk.title,
-                        "summary": chunk.summary,
-                        **chunk.metadata,
-                    }
-                ],
-                ids=[f"{chunk.url}_{chunk.chunk_number}"],
+                documents=documents,
+                embeddings=embeddings_batch,
+                metadatas=metadatas,
+                ids=ids,
             )
         )
-        print(f"Inserted chunk {chunk.chunk_number} for {chunk.url}")
+        inserted = list(range(len(chunks)))
     except Exception as e:
-        print(f"Error inserting chunk for {chunk.url} (chunk {chunk.chunk_number}): {e}")
+        print(f"Error inserting batch of {len(chunks)} chunks: {e}. Retrying one by one.")
 
+        # Fall back to single adds so one bad chunk doesn't drop the whole batch
+        inserted = []
+        for i in range(len(chunks)):
+            try:
+                await loop.run_in_executor(
+                    None,
+                    lambda: collection.add(
+                        documents=documents[i:i + 1],
+                        embeddings=embeddings_batch[i:i + 1],
+                        metadatas=metadatas[i:i + 1],
+                        ids=ids[i:i + 1],
+                    )
+                )
+                inserted.append(i)
+            except Exception as e:
+                print(f"Error inserting chunk {ids[i]}: {e}")
 
-async def process_and_store_document(collection, url: str, content: str):
-    """Process a document and store its chunks in ChromaDB."""
+    try:
+        await loop.run_in_executor(
+            None,
+            lambda: add_to_store(collection, [ids[i] for i in inserted], [embeddings_batch[i] for i in inserted]),
+        )
+    except Exception as e:
+        print(f"Error adding {len(inserted)} chunks to the FAISS index: {e}")
+    await record_added([metadatas[i] for i in inserted])
+    if dedup is not None:
+        stored = set(inserted)
+        dedup.confirm([(chunks[i].metadata["source"], chunks[i].content) for i in inserted])
+        dedup.release([(chunk.metadata["source"], chunk.content) for i, chunk in enumerate(chunks) if i not in stored])
+    print(f"Inserted {len(inserted)} chunks")
+    return len(inserted)
+
+
+def _section_title(page_title: str, chunk_number: int, chunk_count: int) -> str:
+    """Number the page title per chunk so multi-chunk pages get distinct titles."""
+    if not page_title or chunk_count <= 1:
+        return page_title
+    return f"{page_title} - ส่วนที่ {chunk_number + 1}"
+
+
+async def prepare_document(
+    url: str, content: str, page_title: str = "", dedup: Optional[DedupIndex] = None
+) -> List[ProcessedChunk]:
+    """Chunk, title and embed a document without storing it.
+
+    With a DedupIndex, chunks that nearly duplicate one already seen on the
+    same domain are dropped before embedding.
+    """
     chunks = chunk_text(content)
-    tasks = [process_chunk(chunk, i, url) for i, chunk in enumerate(chunks)]
-    processed_chunks = await asyncio.gather(*tasks)
-    insert_tasks = [insert_chunk(collection, chunk) for chunk in processed_chunks]
-    await asyncio.gather(*insert_tasks)
+
+    # Per-document metadata, computed once rather than per chunk
+    parsed_url = urlparse(url)
+    crawled_at = datetime.now(timezone.utc).isoformat()
+
+    # Kept chunks retain their position in the page as chunk_number
+    numbered_chunks = [
+        (i, chunk) for i, chunk in enumerate(chunks)
+        if dedup is None or dedup.add_if_new(parsed_url.netloc, chunk)
+    ]
+    if len(numbered_chunks) < len(chunks):
+        print(f"Skipped {len(chunks) - len(numbered_chunks)} duplicate chunks on {url}")
+
+    try:
+        chunk_embeddings = await get_embeddings([chunk for _, chunk in numbered_chunks])
+    except BaseException:
+        if dedup is not None:
+            dedup.release([(parsed_url.netloc, chunk) for _, chunk in numbered_chunks])
+        raise
+
+    # A zero vector means embedding failed; leave the chunk out so a later crawl retries it
+    embedded_chunks = []
+    failed_chunks = []
+    for (i, chunk), embedding in zip(numbered_chunks, chunk_embeddings):
+        if any(embedding):
+            embedded_chunks.append((i, chunk, embedding))
+        else:
+            failed_chunks.append((parsed_url.netloc, chunk))
+    if failed_chunks:
+        print(f"Skipped {len(failed_chunks)} chunks on {url} that could not be embedded")
+        if dedup is not None:
+            dedup.release(failed_chunks)
+
+    tasks = [
+        process_chunk(
+            chunk, i, url, parsed_url.netloc, parsed_url.path, crawled_at, embedding,
+            page_title=_section_title(page_title, i, len(chunks)),
+        )
+        for i, chunk, embedding in embedded_chunks
+    ]
+    return list(await asyncio.gather(*tasks))
+
+
+async def _load_dedup_index(collection) -> Optional[DedupIndex]:
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, get_dedup_index, collection)
+    except Exception as e:
+        print(f"Error loading dedup index, storing all chunks: {e}")
+        return None
+
+
+async def _save_dedup_index(collection):
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, save_dedup_index, collection)
+    except Exception as e:
+        print(f"Error saving dedup index: {e}")
+
+
+async def process_and_store_document(collection, url: str, content: str, page_title: str = ""):
+    """Process a document and store its chunks in ChromaDB."""
+    dedup = await _load_dedup_index(collection)
+    processed_chunks = await prepare_document(url, content, page_title, dedup)
+    await insert_chunks(collection, processed_chunks, dedup)
+    await _save_dedup_index(collection)
     return len(processed_chunks)
 
 
 async def fetch_url(session, url: str) -> Optional[str]:
     """Fetch URL content using aiohttp."""
     try:
-        async with session.get(url, timeout=30) as response:
+        started = time.perf_counter()
+        async with session.get(url, headers=FETCH_HEADERS, timeout=FETCH_TIMEOUT) as response:
+            ttfb = time.perf_counter() - started
             if response.status == 200:
-                html = await response.text()
+                # Decode once ourselves; text() would sniff the charset when the header lacks one
+                raw = await response.read()
+                try:
+                    html = raw.decode(response.charset or "utf-8", errors="replace")
+                except LookupError:  # Unknown charset name in the Content-Type header
+                    html = raw.decode("utf-8", errors="replace")
+                print(f"Fetched {url} (TTFB {ttfb * 1000:.0f} ms, {len(raw)} bytes)")
                 return html
             else:
                 print(f"Error fetching {url}: Status {response.status}")
@@ -201,16 +380,18 @@ async def fetch_url(session, url: str) -> Optional[str]:
         return None
 
 
-def extract_text_from_html(html: str) -> str:
-    """Extract clean text content from HTML."""
-    soup = BeautifulSoup(html, "lxml")
-    
+def extract_text(tree: LexborHTMLParser) -> str:
+    """Extract clean text content from a parsed HTML tree.
+
+    Boilerplate nodes are removed from the tree in place, so extract links first.
+    """
     # Remove script and style elements
-    for element in soup(["script", "style", "header", "footer", "nav"]):
-        element.decompose()
+    for node in tree.css("script, style, header, footer, nav"):
+        node.decompose()
     
     # Get text and clean it
-    text = soup.get_text(separator="\n")
+    root = tree.body or tree.root
+    text = root.text(separator="\n") if root is not None else ""
     
     # Remove empty lines and excessive whitespace
     lines = [line.strip() for line in text.splitlines() if line.strip()]
@@ -219,57 +400,115 @@ def extract_text_from_html(html: str) -> str:
     return text
 
 
-def extract_links_from_html(html: str, base_url: str) -> List[str]:
-    """Extract all links from HTML content."""
-    soup = BeautifulSoup(html, "lxml")
-    links = []
+def extract_page_title(tree: LexborHTMLParser) -> str:
+    """Return the page <title>, or the first <h1> if there is no usable title."""
+    for selector in ("title", "h1"):
+        node = tree.css_first(selector)
+        if node is not None:
+            title = " ".join(node.text().split())
+            if title:
+                return title
+    return ""
+
+
+def extract_links(tree: LexborHTMLParser, base_url: str) -> List[str]:
+    """Extract all same-domain links from a parsed HTML tree."""
+    base_netloc = urlparse(base_url).netloc
+    links = set()  # Remove duplicates
     
-    for a_tag in soup.find_all("a", href=True):
-        href = a_tag["href"]
+    for node in tree.css("a[href]"):
         # Convert relative links to absolute
-        full_url = urljoin(base_url, href)
+        full_url = urljoin(base_url, node.attributes.get("href") or "")
         # Keep only links from the same domain
-        if urlparse(full_url).netloc == urlparse(base_url).netloc:
-            links.append(full_url)
+        if urlparse(full_url).netloc == base_netloc:
+            links.add(full_url)
     
-    return list(set(links))  # Remove duplicates
+    return list(links)
 
 
 async def crawl_website(collection, start_url: str, max_pages: int = 100):
     """Crawl website starting from start_url and store content in ChromaDB."""
+    try:
+        return await _crawl_website(collection, start_url, max_pages)
+    finally:
+        # Release the crawl's pooled connections rather than leaving them to GC
+        await close_session()
+
+
+async def _crawl_website(collection, start_url: str, max_pages: int):
     print(f"Starting crawl from {start_url}")
     visited_urls = set()
-    queued_urls = {start_url}
+    seen_urls = {start_url}  # Visited or already queued
     processed_count = 0
-    
-    async with aiohttp.ClientSession() as session:
-        while queued_urls and len(visited_urls) < max_pages:
-            # Get next URL to process
-            current_url = queued_urls.pop()
-            if current_url in visited_urls:
-                continue
-                
-            print(f"Crawling {current_url}")
-            visited_urls.add(current_url)
-            
-            # Fetch and process content
-            html = await fetch_url(session, current_url)
-            if html:
-                # Extract text content
-                text_content = extract_text_from_html(html)
+    pending_chunks: List[ProcessedChunk] = []
+
+    queue: asyncio.Queue = asyncio.Queue()
+    queue.put_nowait(start_url)
+    # Crawls stay on one domain, so this caps concurrent requests to that host
+    fetch_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    # Set once max_pages URLs are claimed; remaining queue entries are drained unprocessed
+    done_event = asyncio.Event()
+    session = await get_session()
+    dedup = await _load_dedup_index(collection)
+
+    async def worker(worker_id: int):
+        nonlocal processed_count, pending_chunks
+        while True:
+            current_url = await queue.get()
+            try:
+                if done_event.is_set() or current_url in visited_urls:
+                    continue
+
+                print(f"[worker {worker_id}] Crawling {current_url}")
+                visited_urls.add(current_url)
+                if len(visited_urls) >= max_pages:
+                    done_event.set()
+
+                async with fetch_semaphore:
+                    html = await fetch_url(session, current_url)
+                if not html:
+                    continue
+
+                # Parse once; links are read before extract_text strips nav/header/footer
+                tree = LexborHTMLParser(html)
+
+                # Queue links before the slow embedding step so idle workers can start fetching
+                if not done_event.is_set():
+                    for link in extract_links(tree, current_url):
+                        if link not in seen_urls:
+                            seen_urls.add(link)
+                            queue.put_nowait(link)
+
+                # Read the title before extract_text drops <header> (which often holds the <h1>)
+                page_title = extract_page_title(tree)
+                text_content = extract_text(tree)
                 if len(text_content) > 500:  # Only process non-empty pages
-                    chunks_added = await process_and_store_document(collection, current_url, text_content)
+                    processed_chunks = await prepare_document(current_url, text_content, page_title, dedup)
+                    pending_chunks.extend(processed_chunks)
                     processed_count += 1
-                    print(f"Processed {current_url} - Added {chunks_added} chunks")
-                
-                # Extract links and add to queue
-                new_links = extract_links_from_html(html, current_url)
-                for link in new_links:
-                    if link not in visited_urls:
-                        queued_urls.add(link)
-                        
-            # Pause to be respectful to the server
-            await asyncio.sleep(1)
-    
+                    print(f"Processed {current_url} - Prepared {len(processed_chunks)} chunks")
+
+                    # Write to ChromaDB in large batches to amortize per-add overhead
+                    if len(pending_chunks) >= INSERT_BATCH_SIZE:
+                        batch, pending_chunks = pending_chunks, []
+                        await insert_chunks(collection, batch, dedup)
+            except Exception as e:
+                print(f"Error crawling {current_url}: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker(i)) for i in range(CRAWL_WORKERS)]
+    await queue.join()
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    await insert_chunks(collection, pending_chunks, dedup)
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: save_store(collection))
+    except Exception as e:
+        print(f"Error saving FAISS index: {e}")
+    await _save_dedup_index(collection)
     print(f"Crawl complete. Processed {processed_count} pages.")
-    return processed_count 
\ No newline at end of file
+    return processed_count
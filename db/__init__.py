@@ -1 +1,2 @@
-from .database import get_chroma_client, init_collection 
\ No newline at end of file
+from .database import get_chroma_client, init_collection
+from .stats import Stats, load_stats, record_added, rebuild_stats
@@ -1,10 +1,22 @@
+import functools
 import chromadb
 from chromadb.config import Settings
 
+try:
+    import streamlit as st
+    # One client/collection per server process, shared across reruns and sessions
+    _cache_resource = st.cache_resource
+except ImportError:
+    # Outside the Streamlit app, keep a single instance per process
+    _cache_resource = functools.lru_cache(maxsize=1)
+
+CHROMA_PATH = "./chroma_db"
+
+@_cache_resource
 def get_chroma_client():
     """Initialize and return a ChromaDB client with persistent storage."""
     return chromadb.PersistentClient(
-        path="./chroma_db",
+        path=CHROMA_PATH,
         settings=Settings(
             allow_reset=True, 
             anonymized_telemetry=False, 
@@ -12,11 +24,18 @@ def get_chroma_client():
         ),
     )
 
+@_cache_resource
 def init_collection(collection_name="agnos_health_data"):
     """Initialize or get a collection from ChromaDB."""
     client = get_chroma_client()
-    return client.get_or_create_collection(
-        name=collection_name,
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=None,  # We'll provide embeddings separately
-    ) 
\ No newline at end of file
+    try:
+        # Existing collections keep the distance they were created with
+        return client.get_collection(name=collection_name, embedding_function=None)
+    except ValueError:
+        # Embeddings are stored unit-length, so inner product ranks like cosine
+        # without Chroma re-normalizing vectors on every add and query
+        return client.create_collection(
+            name=collection_name,
+            metadata={"hnsw:space": "ip"},
+            embedding_function=None,  # We'll provide embeddings separately
+        )
@@ -0,0 +1,98 @@
+import os
+import json
+import asyncio
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional
+
+from .database import CHROMA_PATH
+
+STATS_PATH = os.path.join(CHROMA_PATH, "stats.json")
+
+# Metadata rows fetched per collection.get when rebuilding stats
+SCAN_PAGE_SIZE = 1000
+
+# Updates run in executor threads, so a thread lock (not an asyncio one) serializes them
+_stats_lock = threading.Lock()
+
+
+@dataclass
+class Stats:
+    """Aggregate collection statistics, kept in a JSON file next to the ChromaDB data."""
+    urls: List[str] = field(default_factory=list)
+    domains: List[str] = field(default_factory=list)
+    doc_count: int = 0
+    last_updated: str = ""
+
+    def update(self, metadatas: List[Dict[str, Any]]):
+        """Fold the metadata of newly added chunks into the aggregate."""
+        self.urls = sorted(set(self.urls).union(meta["url"] for meta in metadatas))
+        self.domains = sorted(set(self.domains).union(meta["source"] for meta in metadatas))
+        self.doc_count += len(metadatas)
+        self.last_updated = max([self.last_updated, *(meta.get("crawled_at", "") for meta in metadatas)])
+
+
+def load_stats(path: str = STATS_PATH) -> Optional[Stats]:
+    """Load stats from the JSON sidecar, or None if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return Stats(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error reading stats file {path}: {e}")
+        return None
+
+
+def save_stats(stats: Stats, path: str = STATS_PATH):
+    """Write stats to the JSON sidecar atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(asdict(stats), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _record_added(metadatas: List[Dict[str, Any]], path: str):
+    with _stats_lock:
+        stats = load_stats(path) or Stats()
+        stats.update(metadatas)
+        save_stats(stats, path)
+
+
+async def record_added(metadatas: List[Dict[str, Any]], path: str = STATS_PATH):
+    """Update the stats sidecar with chunks that were just added to the collection."""
+    if not metadatas:
+        return
+    try:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, lambda: _record_added(metadatas, path))
+    except Exception as e:
+        print(f"Error updating stats file {path}: {e}")
+
+
+def _save_stats_locked(stats: Stats, path: str):
+    with _stats_lock:
+        save_stats(stats, path)
+
+
+async def rebuild_stats(collection, path: str = STATS_PATH) -> Stats:
+    """Recompute stats with a paginated metadata scan and write them to the sidecar."""
+    loop = asyncio.get_event_loop()
+    stats = Stats()
+    offset = 0
+    while True:
+        page = await loop.run_in_executor(
+            None,
+            lambda: collection.get(include=["metadatas"], limit=SCAN_PAGE_SIZE, offset=offset),
+        )
+        if not page["metadatas"]:
+            break
+        stats.update(page["metadatas"])
+        offset += len(page["metadatas"])
+
+    try:
+        await loop.run_in_executor(None, lambda: _save_stats_locked(stats, path))
+    except Exception as e:
+        print(f"Error writing stats file {path}: {e}")
+    return stats
@@ -0,0 +1,3 @@
+from .http_client import get_session, close_session
+from .ollama import generate, stream_generate, load_llm
+from .embeddings import embed_texts
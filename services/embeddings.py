@@ -0,0 +1,56 @@
+import os
+from typing import List
+import aiohttp
+import numpy as np
+import orjson
+
+from .http_client import get_session
+from .ollama import EMBEDDING_MODEL, OLLAMA_HOST
+
+# "ollama" (default) or "infinity" for a local Infinity server, e.g.
+#   infinity_emb v2 --model-id BAAI/bge-m3 --port 7997 --dtype float16 --batch-size 64
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama").lower()
+INFINITY_HOST = os.getenv("INFINITY_HOST", "http://localhost:7997")
+INFINITY_MODEL = os.getenv("INFINITY_MODEL", "BAAI/bge-m3")
+
+# Large batches on CPU can take longer than the shared session's default timeout
+EMBED_TIMEOUT = aiohttp.ClientTimeout(total=120, connect=10)
+
+
+def normalize(vectors: List[List[float]]) -> List[List[float]]:
+    """Scale vectors to unit length, so inner product equals cosine similarity."""
+    if not vectors:
+        return vectors
+    v = np.asarray(vectors, dtype="float32")
+    v /= np.linalg.norm(v, axis=1, keepdims=True) + 1e-12
+    return v.tolist()
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts with a single request to the configured embedding backend.
+
+    Vectors are returned unit-length.
+    """
+    return normalize(await _request_embeddings(texts))
+
+
+async def _request_embeddings(texts: List[str]) -> List[List[float]]:
+    session = await get_session()
+    if EMBEDDING_BACKEND == "infinity":
+        async with session.post(
+            f"{INFINITY_HOST}/embeddings",
+            json={"model": INFINITY_MODEL, "input": texts},
+            timeout=EMBED_TIMEOUT,
+        ) as response:
+            response.raise_for_status()
+            data = (await response.json(loads=orjson.loads))["data"]
+        # OpenAI-style response; items carry their input index
+        return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+
+    async with session.post(
+        f"{OLLAMA_HOST}/api/embed",
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=EMBED_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        return (await response.json(loads=orjson.loads))["embeddings"]
@@ -0,0 +1,46 @@
+import asyncio
+import atexit
+import weakref
+import aiohttp
+
+# One pooled session per event loop. aiohttp sessions can't be shared across
+# loops, and Streamlit starts a new loop (asyncio.run) on every rerun.
+_sessions = weakref.WeakKeyDictionary()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for the running event loop."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        # Forget sessions whose loop has already been shut down
+        for stale_loop in [l for l in _sessions if l.is_closed()]:
+            del _sessions[stale_loop]
+
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, limit_per_host=10, enable_cleanup_closed=True),
+            timeout=aiohttp.ClientTimeout(total=60, connect=10),
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """Close the shared session for the running event loop, if any."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def _close_sessions_at_exit():
+    """Close sessions whose loop is still usable when the interpreter exits."""
+    for loop, session in list(_sessions.items()):
+        if session.closed or loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(session.close())
+        except Exception as e:
+            print(f"Error closing HTTP session: {e}")
+
+
+atexit.register(_close_sessions_at_exit)
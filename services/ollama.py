@@ -0,0 +1,76 @@
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+import aiohttp
+import orjson
+from dotenv import load_dotenv
+
+from .http_client import get_session
+
+# Load environment variables
+load_dotenv()
+
+# Ollama connection and models, shared by the crawler and the RAG pipeline
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-m3")
+
+# env.example ships the host without a scheme; raw HTTP calls need one
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
+
+# Generation can stream for minutes; only bound connecting and gaps between tokens
+GENERATE_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=10, sock_read=120)
+
+
+async def generate(prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Return the complete LLM response for a prompt."""
+    payload = {"model": LLM_MODEL, "prompt": prompt, "stream": False}
+    if options:
+        payload["options"] = options
+
+    session = await get_session()
+    async with session.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=GENERATE_TIMEOUT) as response:
+        response.raise_for_status()
+        return (await response.json(loads=orjson.loads))["response"]
+
+
+async def stream_generate(prompt: str) -> AsyncIterator[str]:
+    """Yield LLM response text for a prompt as it is produced."""
+    session = await get_session()
+    async with session.post(
+        f"{OLLAMA_HOST}/api/generate",
+        json={"model": LLM_MODEL, "prompt": prompt, "stream": True},
+        timeout=GENERATE_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        # One JSON object per line
+        async for line in response.content:
+            if not line.strip():
+                continue
+            chunk = orjson.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                break
+
+
+async def load_llm():
+    """Load the LLM into Ollama's memory without generating anything."""
+    # A generate request without a prompt just loads the model
+    session = await get_session()
+    async with session.post(f"{OLLAMA_HOST}/api/generate", json={"model": LLM_MODEL}) as response:
+        response.raise_for_status()
+
+
+async def embed_one(text: str) -> List[float]:
+    """Embed one text via the legacy single-text /api/embeddings endpoint.
+
+    For Ollama servers that predate the batched /api/embed endpoint.
+    """
+    session = await get_session()
+    async with session.post(
+        f"{OLLAMA_HOST}/api/embeddings",
+        json={"model": EMBEDDING_MODEL, "prompt": text},
+    ) as response:
+        response.raise_for_status()
+        return (await response.json(loads=orjson.loads))["embedding"]
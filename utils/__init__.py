@@ -1 +1 @@
-from .rag_utils import get_db_stats, query_rag_system 
\ No newline at end of file
+from .rag_utils import finalize_answer, get_db_stats, query_rag_system, warmup
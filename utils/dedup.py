@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+from db.database import CHROMA_PATH
+
+# Character shingles rather than words, since Thai is written without spaces
+SHINGLE_SIZE = 4
+
+# Chunks whose fingerprints differ in at most this many bits count as duplicates
+MAX_HAMMING_DISTANCE = 3
+
+# Fingerprints within MAX_HAMMING_DISTANCE of each other agree exactly on at
+# least one of MAX_HAMMING_DISTANCE + 1 bands, so only band matches are compared
+_BAND_COUNT = MAX_HAMMING_DISTANCE + 1
+_BAND_BITS = 64 // _BAND_COUNT
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+# Rows fetched per collection.get when rebuilding fingerprints from ChromaDB
+SCAN_PAGE_SIZE = 1000
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the lowercased, whitespace-normalized text's character shingles."""
+    normalized = " ".join(text.lower().split())
+    shingle_count = max(1, len(normalized) - SHINGLE_SIZE + 1)
+    digests = b"".join(
+        hashlib.blake2b(normalized[i:i + SHINGLE_SIZE].encode("utf-8"), digest_size=8).digest()
+        for i in range(shingle_count)
+    )
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(shingle_count, 64)
+    # A fingerprint bit is set when most shingle hashes have it set
+    majority = bits.sum(axis=0) * 2 > shingle_count
+    return int.from_bytes(np.packbits(majority).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count("1")
+
+
+class DedupIndex:
+    """SimHash fingerprints of stored chunks, per domain, for skipping near-duplicates.
+
+    Forum pages repeat the same headers, navigation and related-post blocks;
+    skipping those chunks saves their embedding calls and keeps them out of
+    retrieval results.
+    """
+
+    def __init__(self, domains: Optional[Dict[str, List[int]]] = None, doc_count: int = 0):
+        self.domains: Dict[str, Set[int]] = {}
+        self.doc_count = doc_count  # Collection size these fingerprints cover
+        self._bands: Dict[tuple, List[int]] = defaultdict(list)
+        # Fingerprints of accepted chunks that are not stored yet; never saved
+        self._pending: Dict[str, Set[int]] = defaultdict(set)
+        self._lock = threading.Lock()
+        for domain, fingerprints in (domains or {}).items():
+            for fingerprint in fingerprints:
+                self._add(domain, fingerprint)
+
+    def _add(self, domain: str, fingerprint: int):
+        fingerprints = self.domains.setdefault(domain, set())
+        if fingerprint in fingerprints:
+            return
+        fingerprints.add(fingerprint)
+        for band in range(_BAND_COUNT):
+            key = (domain, band, (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK)
+            self._bands[key].append(fingerprint)
+
+    def _is_near_duplicate(self, domain: str, fingerprint: int) -> bool:
+        for band in range(_BAND_COUNT):
+            key = (domain, band, (fingerprint >> (band * _BAND_BITS)) & _BAND_MASK)
+            for candidate in self._bands.get(key, ()):
+                if hamming_distance(fingerprint, candidate) <= MAX_HAMMING_DISTANCE:
+                    return True
+        return False
+
+    def add_if_new(self, domain: str, text: str) -> bool:
+        """Reserve the text's fingerprint and return True, unless it nearly duplicates a stored or reserved one.
+
+        A reservation becomes permanent through confirm() once the chunk is
+        stored, and is dropped by release() if it never is.
+        """
+        fingerprint = simhash(text)
+        with self._lock:
+            pending = self._pending[domain]
+            if self._is_near_duplicate(domain, fingerprint) or any(
+                hamming_distance(fingerprint, other) <= MAX_HAMMING_DISTANCE for other in pending
+            ):
+                return False
+            pending.add(fingerprint)
+            return True
+
+    def confirm(self, chunks: List[Tuple[str, str]]):
+        """Record (domain, text) chunks that were stored, turning their reservations permanent."""
+        fingerprints = [(domain, simhash(text)) for domain, text in chunks]
+        with self._lock:
+            for domain, fingerprint in fingerprints:
+                self._pending[domain].discard(fingerprint)
+                self._add(domain, fingerprint)
+            if fingerprints:
+                # Unsaved until save() stamps the collection size again
+                self.doc_count = -1
+
+    def release(self, chunks: List[Tuple[str, str]]):
+        """Drop reservations for (domain, text) chunks that were not stored."""
+        fingerprints = [(domain, simhash(text)) for domain, text in chunks]
+        with self._lock:
+            for domain, fingerprint in fingerprints:
+                self._pending[domain].discard(fingerprint)
+
+    def save(self, doc_count: int, path: str):
+        """Write the fingerprints to disk atomically, stamped with the collection size they cover."""
+        with self._lock:
+            self.doc_count = doc_count
+            data = {
+                "doc_count": doc_count,
+                "domains": {domain: sorted(fingerprints) for domain, fingerprints in self.domains.items()},
+            }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DedupIndex"]:
+        """Read saved fingerprints, or None if they are missing or unreadable."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data["domains"], data["doc_count"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error reading dedup file {path}: {e}")
+            return None
+
+
+_indexes: Dict[str, DedupIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _dedup_path(collection) -> str:
+    return os.path.join(CHROMA_PATH, f"simhash_{collection.name}.json")
+
+
+def build_dedup_index(collection) -> DedupIndex:
+    """Fingerprint every chunk currently stored in a ChromaDB collection."""
+    index = DedupIndex()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=SCAN_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        for document, meta in zip(page["documents"], page["metadatas"]):
+            # Stored chunks are all recorded, even ones that duplicate each other
+            index._add(meta.get("source", ""), simhash(document))
+    index.doc_count = offset
+    return index
+
+
+def get_dedup_index(collection) -> DedupIndex:
+    """Return the DedupIndex for a collection, rebuilding it if it no longer matches ChromaDB.
+
+    Only fingerprints of stored chunks are kept, so a collection that changed
+    outside a crawl (or a crawl that stopped before saving) is what the size
+    check catches.
+    """
+    with _indexes_lock:
+        doc_count = collection.count()
+        index = _indexes.get(collection.name)
+        if index is None:
+            index = DedupIndex.load(_dedup_path(collection))
+        if index is None or index.doc_count != doc_count:
+            index = build_dedup_index(collection)
+            index.save(doc_count, _dedup_path(collection))
+        _indexes[collection.name] = index
+        return index
+
+
+def save_dedup_index(collection):
+    """Persist the collection's DedupIndex, if loaded, for the current collection size."""
+    with _indexes_lock:
+        index = _indexes.get(collection.name)
+    if index is not None:
+        index.save(collection.count(), _dedup_path(collection))
@@ -0,0 +1,192 @@
+import os
+import json
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+import faiss
+
+from db.database import CHROMA_PATH
+
+# Embedding rows fetched per collection.get when building an index from ChromaDB
+BUILD_PAGE_SIZE = 1000
+
+# Vectors used to train the 8-bit scalar quantizer
+TRAIN_SAMPLE_SIZE = 100_000
+
+# HNSW graph degree and search breadth
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+
+
+class FaissStore:
+    """In-memory FAISS index mirroring a ChromaDB collection's embeddings.
+
+    Vectors are stored as 8-bit scalar-quantized codes in an HNSW graph
+    (IndexHNSWSQ), a quarter of the memory of float32. ChromaDB keeps the
+    full-precision vectors and stays the durable store; this only answers
+    nearest-neighbour searches and maps FAISS row numbers back to ChromaDB ids.
+    """
+
+    def __init__(self, index=None, ids: Optional[List[str]] = None, trained_on: int = 0):
+        self.index = index  # Created and trained on the first add, once there is data
+        self.ids: List[str] = list(ids or [])
+        self.trained_on = trained_on
+        self._id_set = set(self.ids)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids: List[str], embeddings: List[List[float]]):
+        """Add vectors for ids not already in the index."""
+        with self._lock:
+            new_rows = [(chunk_id, vector) for chunk_id, vector in zip(ids, embeddings) if chunk_id not in self._id_set]
+            if not new_rows:
+                return
+
+            vectors = np.asarray([vector for _, vector in new_rows], dtype="float32")
+            # Unit-length vectors make inner product equal to cosine similarity
+            faiss.normalize_L2(vectors)
+            if self.index is None:
+                self.index = faiss.IndexHNSWSQ(
+                    vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+                )
+                self.index.hnsw.efSearch = HNSW_EF_SEARCH
+            if not self.index.is_trained:
+                # The quantizer learns per-dimension value ranges from this sample
+                sample = vectors
+                if len(vectors) > TRAIN_SAMPLE_SIZE:
+                    rows = np.random.default_rng(0).choice(len(vectors), TRAIN_SAMPLE_SIZE, replace=False)
+                    sample = vectors[rows]
+                self.index.train(sample)
+                self.trained_on = len(sample)
+            self.index.add(vectors)
+
+            for chunk_id, _ in new_rows:
+                self.ids.append(chunk_id)
+                self._id_set.add(chunk_id)
+
+    def needs_retrain(self) -> bool:
+        """True once the index holds far more vectors than its quantizer was trained on.
+
+        Value ranges learned from a small first batch (e.g. one page) clip
+        later vectors and wreck recall.
+        """
+        return self.index is not None and self.trained_on * 2 < min(len(self.ids), TRAIN_SAMPLE_SIZE)
+
+    def search(self, query_embeddings: List[List[float]], k: int) -> List[List[str]]:
+        """Return the ids of the k nearest chunks for each query, best first."""
+        with self._lock:
+            if self.index is None or not self.ids:
+                return [[] for _ in query_embeddings]
+
+            queries = np.asarray(query_embeddings, dtype="float32")
+            faiss.normalize_L2(queries)
+            _, rows = self.index.search(queries, min(k, len(self.ids)))
+            return [[self.ids[row] for row in query_rows if row >= 0] for query_rows in rows]
+
+    def save(self, index_path: str, meta_path: str):
+        """Write the index and its id mapping to disk."""
+        with self._lock:
+            if self.index is None:
+                return
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            faiss.write_index(self.index, index_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"ids": self.ids, "trained_on": self.trained_on}, f)
+
+    @classmethod
+    def load(cls, index_path: str, meta_path: str) -> Optional["FaissStore"]:
+        """Read a saved index, or None if it is missing or unreadable."""
+        if not (os.path.exists(index_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            index = faiss.read_index(index_path)
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            return cls(index, meta["ids"], meta["trained_on"])
+        except Exception as e:
+            print(f"Error loading FAISS index {index_path}: {e}")
+            return None
+
+
+_stores: Dict[str, FaissStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _store_paths(collection):
+    base = os.path.join(CHROMA_PATH, f"faiss_{collection.name}")
+    return f"{base}.index", f"{base}.json"
+
+
+def build_store(collection) -> FaissStore:
+    """Build a FaissStore from every embedding currently in a ChromaDB collection."""
+    store = FaissStore()
+    offset = 0
+    # Buffer pages until there is a full training sample, then stream the rest
+    buffered_ids, buffered_embeddings = [], []
+    while True:
+        page = collection.get(include=["embeddings"], limit=BUILD_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        if store.index is None:
+            buffered_ids.extend(page["ids"])
+            buffered_embeddings.extend(page["embeddings"])
+            if len(buffered_ids) >= TRAIN_SAMPLE_SIZE:
+                store.add(buffered_ids, buffered_embeddings)
+                buffered_ids, buffered_embeddings = [], []
+        else:
+            store.add(page["ids"], page["embeddings"])
+    store.add(buffered_ids, buffered_embeddings)
+    print(f"Built FAISS index for {collection.name} with {len(store)} vectors")
+    return store
+
+
+def _load_or_build_store(collection) -> FaissStore:
+    index_path, meta_path = _store_paths(collection)
+    doc_count = collection.count()
+    store = FaissStore.load(index_path, meta_path)
+    # Rebuild if the saved index is out of sync with ChromaDB, or was trained
+    # on a much smaller sample than is now available (e.g. the first crawl batch)
+    if store is None or len(store) != doc_count or store.needs_retrain():
+        store = build_store(collection)
+        store.save(index_path, meta_path)
+    return store
+
+
+def get_store(collection) -> FaissStore:
+    """Return the FaissStore for a collection, loading or building it on first use."""
+    with _stores_lock:
+        store = _stores.get(collection.name)
+        if store is None:
+            store = _load_or_build_store(collection)
+            _stores[collection.name] = store
+        return store
+
+
+def add_to_store(collection, ids: List[str], embeddings: List[List[float]]):
+    """Mirror vectors just added to ChromaDB into the collection's FaissStore, if built.
+
+    An unbuilt store is left alone; it will read these vectors from ChromaDB when built.
+    A store that has outgrown its training sample is rebuilt from ChromaDB, which
+    retrains the quantizer; with the sample doubling each time this happens only
+    a handful of times before TRAIN_SAMPLE_SIZE is reached.
+    """
+    # Held across the add and any rebuild so concurrent inserts can't land in a replaced store
+    with _stores_lock:
+        store = _stores.get(collection.name)
+        if store is None:
+            return
+        store.add(ids, embeddings)
+        if store.needs_retrain():
+            _stores[collection.name] = build_store(collection)
+
+
+def save_store(collection):
+    """Persist the collection's FaissStore, if built, so the next start can skip the rebuild."""
+    with _stores_lock:
+        store = _stores.get(collection.name)
+    if store is not None:
+        store.save(*_store_paths(collection))
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from typing import Awaitable, Callable, List
+
+# How long to wait for more queries to join a batch, and the most queries per batch
+BATCH_WINDOW_SECONDS = 0.02
+MAX_BATCH_SIZE = 16
+
+
+class QueryBatcher:
+    """Coalesces concurrent retrievals into one embedding call and one index search.
+
+    Streamlit runs every session on its own thread and event loop, so the
+    batcher runs its own loop on a daemon thread; callers on any loop hand
+    their queries over and await the result.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+        search: Callable[[List[List[float]], int], List[List[str]]],
+    ):
+        self._embed = embed
+        self._search = search  # Blocking; run in the default executor
+        self._loop = asyncio.new_event_loop()
+        self._queue = None
+        self._ready = threading.Event()
+        threading.Thread(target=self._run, name="query-batcher", daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._dispatch_forever())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def submit(self, queries: List[str], k: int) -> List[List[str]]:
+        """Return the ids of the k nearest chunks for each query, best first."""
+        future = asyncio.run_coroutine_threadsafe(self._enqueue(queries, k), self._loop)
+        return await asyncio.wrap_future(future)
+
+    async def _enqueue(self, queries: List[str], k: int) -> List[List[str]]:
+        result = self._loop.create_future()
+        await self._queue.put((queries, k, result))
+        return await result
+
+    async def _dispatch_forever(self):
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = self._loop.time() + BATCH_WINDOW_SECONDS
+            while size < MAX_BATCH_SIZE:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        texts = [query for queries, _, _ in batch for query in queries]
+        k = max(item_k for _, item_k, _ in batch)
+        try:
+            embeddings = await self._embed(texts)
+            ranked_ids = await self._loop.run_in_executor(None, lambda: self._search(embeddings, k))
+        except Exception as e:
+            for _, _, result in batch:
+                if not result.done():
+                    result.set_exception(e)
+            return
+
+        # Hand each caller its own slice of the batched results
+        offset = 0
+        for queries, item_k, result in batch:
+            if not result.done():  # Caller may have been cancelled
+                result.set_result([ids[:item_k] for ids in ranked_ids[offset:offset + len(queries)]])
+            offset += len(queries)
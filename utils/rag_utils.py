@@ -1,47 +1,43 @@
-import os
-from typing import List, Dict, Any
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, AsyncIterator
 from datetime import datetime
 import asyncio
-from langchain_ollama import OllamaEmbeddings, OllamaLLM
 
-# Initialize Ollama models
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
-LLM_MODEL = os.getenv("LLM_MODEL", "llama3.2")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "bge-m3")
+from db.stats import load_stats, rebuild_stats
+from services.embeddings import embed_texts
+from services.ollama import load_llm, stream_generate
+from .faiss_store import get_store
+from .query_batcher import QueryBatcher
 
-# Initialize LLM with streaming capability
-llm = OllamaLLM(
-    model=LLM_MODEL,
-    base_url=OLLAMA_HOST
-)
+# Query embeddings kept in memory, keyed by a digest of the normalized query
+QUERY_EMBEDDING_CACHE_SIZE = 512
+_query_embedding_cache: "OrderedDict[bytes, Tuple[float, ...]]" = OrderedDict()
 
-# Initialize embeddings
-embeddings = OllamaEmbeddings(
-    model=EMBEDDING_MODEL,
-    base_url=OLLAMA_HOST
-)
+# One QueryBatcher per collection, shared by all sessions
+_batchers: Dict[str, QueryBatcher] = {}
+_batchers_lock = threading.Lock()
+
+DISCLAIMER_TEXT = "ข้อมูลนี้เป็นเพียงข้อมูลเบื้องต้นที่สรุปจากกระทู้ถามตอบในฟอรั่ม Agnos Health และไม่สามารถใช้แทนคำแนะนำ การวินิจฉัย หรือการรักษาจากแพทย์ผู้เชี่ยวชาญได้ หากคุณมีข้อกังวลด้านสุขภาพ กรุณาปรึกษาแพทย์โดยตรงนะคะ/ครับ"
+NO_CONTEXT_ANSWER = "ขออภัยค่ะ/ครับ ดิฉันไม่พบข้อมูลที่เกี่ยวข้องโดยตรงกับคำถามของคุณในฐานข้อมูล ณ ขณะนี้"
+INSUFFICIENT_CONTEXT_ANSWER = "ข้อมูลที่มีอยู่อาจไม่เพียงพอที่จะให้คำตอบที่ชัดเจนสำหรับคำถามนี้ค่ะ/ครับ"
 
 async def get_db_stats(collection):
     """Get statistics about the current ChromaDB collection asynchronously."""
     try:
         loop = asyncio.get_event_loop()
-        # Assuming collection.get() is a synchronous (blocking) call
-        results = await loop.run_in_executor(None, lambda: collection.get(include=["metadatas"]))
-
-        if not results["metadatas"]:
+        doc_count = await loop.run_in_executor(None, collection.count)
+        if not doc_count:
             return None
 
-        # Get unique URLs
-        urls = set(meta["url"] for meta in results["metadatas"])
-
-        # Get domains/sources
-        domains = set(meta["source"] for meta in results["metadatas"])
-
-        # Get document count
-        doc_count = len(results["ids"])
+        # Aggregates are maintained at insert time; only scan if they are missing or stale
+        stats = await loop.run_in_executor(None, load_stats)
+        if stats is None or stats.doc_count != doc_count:
+            stats = await rebuild_stats(collection)
 
         # Format last updated time
-        last_updated = max(meta.get("crawled_at", "") for meta in results["metadatas"])
+        last_updated = stats.last_updated
         if last_updated:
             # Convert to local timezone
             dt = datetime.fromisoformat(last_updated.replace("Z", "+00:00"))
@@ -50,8 +46,8 @@ async def get_db_stats(collection):
             last_updated = dt.strftime("%Y-%m-%d %H:%M:%S %Z")
 
         return {
-            "urls": list(urls),
-            "domains": list(domains),
+            "urls": stats.urls,
+            "domains": stats.domains,
             "doc_count": doc_count,
             "last_updated": last_updated,
         }
@@ -60,31 +56,164 @@ async def get_db_stats(collection):
         return None
 
 
+async def warmup(collection):
+    """Load the embedding and LLM models and build the FAISS index before the first question."""
+    async def load_models():
+        await embed_texts(["warm"])
+        await load_llm()
+
+    loop = asyncio.get_event_loop()
+    results = await asyncio.gather(
+        load_models(),
+        loop.run_in_executor(None, get_store, collection),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Warmup step failed: {result}")
+
+
+def _query_cache_key(query: str) -> bytes:
+    """Digest of a query with whitespace normalized, used as the embedding cache key."""
+    normalized = " ".join(query.split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+async def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed queries with one embedding request, serving repeats from an LRU cache."""
+    keys = [_query_cache_key(query) for query in queries]
+
+    # Hits are refreshed and kept locally before any eviction; misses are unique, in order
+    found = {}
+    missing = {}
+    for key, query in zip(keys, queries):
+        if key in found or key in missing:
+            continue
+        cached = _query_embedding_cache.get(key)
+        if cached is not None:
+            _query_embedding_cache.move_to_end(key)
+            found[key] = cached
+        else:
+            missing[key] = query
+
+    if missing:
+        vectors = await embed_texts(list(missing.values()))
+        for key, vector in zip(missing, vectors):
+            found[key] = _query_embedding_cache[key] = tuple(vector)
+        while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embedding_cache.popitem(last=False)
+
+    return [list(found[key]) for key in keys]
+
+
+def build_retrieval_queries(query: str, chat_history: List[Dict[str, str]]) -> List[str]:
+    """Return the query plus a history-aware variant when there is a previous user turn."""
+    queries = [query]
+    previous_user_turns = [msg["content"] for msg in chat_history if msg["role"] == "user"]
+    if previous_user_turns:
+        # Lets follow-ups like "what about children?" still match the earlier topic
+        queries.append(f"{previous_user_turns[-1]}\n{query}")
+    return queries
+
+
+def merge_ranked_ids(ranked_ids: List[List[str]], num_results: int) -> List[str]:
+    """Interleave per-query result ids by rank, dropping duplicates."""
+    merged = []
+    seen_ids = set()
+    for rank in range(max((len(ids) for ids in ranked_ids), default=0)):
+        for ids in ranked_ids:
+            if rank < len(ids) and ids[rank] not in seen_ids:
+                seen_ids.add(ids[rank])
+                merged.append(ids[rank])
+    return merged[:num_results]
+
+
+def load_documents(collection, ids: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Load chunk text and metadata from ChromaDB, in the order of ids."""
+    if not ids:
+        return []
+
+    records = collection.get(ids=ids, include=["documents", "metadatas"])
+    # collection.get doesn't keep the requested order
+    by_id = {
+        chunk_id: (doc, metadata)
+        for chunk_id, doc, metadata in zip(records["ids"], records["documents"], records["metadatas"])
+    }
+    return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+
+def get_query_batcher(collection) -> QueryBatcher:
+    """Return the process-wide QueryBatcher for a collection."""
+    with _batchers_lock:
+        batcher = _batchers.get(collection.name)
+        if batcher is None:
+            batcher = QueryBatcher(
+                embed=embed_queries,
+                search=lambda embeddings, k: get_store(collection).search(embeddings, k),
+            )
+            _batchers[collection.name] = batcher
+        return batcher
+
+
+async def _single_chunk_stream(text: str) -> AsyncIterator[str]:
+    """Wrap a ready-made answer in the same async stream shape as an LLM answer."""
+    yield text
+
+
+async def stream_llm_answer(prompt: str) -> AsyncIterator[str]:
+    """Stream answer text from Ollama's /api/generate as it is produced."""
+    try:
+        async for token in stream_generate(prompt):
+            yield token
+    except Exception as e:
+        print(f"Error streaming LLM answer: {e}")
+        yield f"\\n\\nเกิดข้อผิดพลาดในการประมวลผลคำถามของคุณ: {str(e)}"
+
+
+def finalize_answer(raw_answer: str) -> str:
+    """Clean up a complete streamed answer and end it with exactly one disclaimer."""
+    processed_answer = raw_answer.replace(DISCLAIMER_TEXT, "").strip()
+    if not processed_answer:
+        # Context was found, but LLM didn't generate a meaningful answer
+        processed_answer = INSUFFICIENT_CONTEXT_ANSWER
+    return f"{processed_answer}\\n\\n{DISCLAIMER_TEXT}"
+
+
 async def query_rag_system(collection, query: str, chat_history: List[Dict[str, str]] = [], num_results: int = 3) -> Dict[str, Any]:
-    """Query the RAG system with a user question and chat history."""
+    """Query the RAG system with a user question and chat history.
+
+    Retrieval happens up front; the answer is returned as an async stream of
+    text under "answer_stream", to be passed to finalize_answer once complete.
+    """
     try:
-        query_embedding = await embeddings.aembed_query(query)
+        # The query and its history-aware variant are embedded and searched
+        # together, batched with any other sessions' concurrent queries
+        retrieval_queries = build_retrieval_queries(query, chat_history)
+        ranked_ids = await get_query_batcher(collection).submit(retrieval_queries, num_results)
+        ids = merge_ranked_ids(ranked_ids, num_results)
 
         loop = asyncio.get_event_loop()
-        results = await loop.run_in_executor(
+        retrieved = await loop.run_in_executor(
             None, # Use default ThreadPoolExecutor
-            lambda: collection.query(
-                query_embeddings=[query_embedding],
-                n_results=num_results,
-                include=["documents", "metadatas"],
-            )
+            lambda: load_documents(collection, ids)
         )
 
+        # Nothing relevant in the database: answer directly without an LLM call
+        if not retrieved:
+            return {
+                "answer_stream": _single_chunk_stream(NO_CONTEXT_ANSWER),
+                "sources": []
+            }
+
         context_parts = []
         sources = []
-        if results["documents"] and results["documents"][0]:
-            for doc, metadata in zip(results["documents"][0], results["metadatas"][0]):
-                context_parts.append(f"- {metadata.get('title', 'ข้อมูลอ้างอิง')}: {doc}")
-                sources.append({
-                    "title": metadata.get("title", "Unknown title"),
-                    "url": metadata.get("url", "#"),
-                    "summary": metadata.get("summary", "No summary available")
-                })
+        for doc, metadata in retrieved:
+            context_parts.append(f"- {metadata.get('title', 'ข้อมูลอ้างอิง')}: {doc}")
+            sources.append({
+                "title": metadata.get("title", "Unknown title"),
+                "url": metadata.get("url", "#"),
+                "summary": metadata.get("summary", "No summary available")
+            })
         
         context = "\\n".join(context_parts)
 
@@ -128,36 +257,14 @@ async def query_rag_system(collection, query: str, chat_history: List[Dict[str,
         ]
         prompt = "\\n\\n".join(prompt_parts)
 
-        # Run synchronous LLM call in an executor to avoid blocking the event loop
-        loop = asyncio.get_event_loop()
-        answer_raw = await loop.run_in_executor(None, lambda: llm.invoke(prompt))
-
-        disclaimer_text = "ข้อมูลนี้เป็นเพียงข้อมูลเบื้องต้นที่สรุปจากกระทู้ถามตอบในฟอรั่ม Agnos Health และไม่สามารถใช้แทนคำแนะนำ การวินิจฉัย หรือการรักษาจากแพทย์ผู้เชี่ยวชาญได้ หากคุณมีข้อกังวลด้านสุขภาพ กรุณาปรึกษาแพทย์โดยตรงนะคะ/ครับ"
-        processed_answer = answer_raw.replace(disclaimer_text, "").strip()
-
-        if not processed_answer or processed_answer == disclaimer_text.strip():
-            if not context_parts: # If no context was found from RAG
-                processed_answer = "ขออภัยค่ะ/ครับ ดิฉันไม่พบข้อมูลที่เกี่ยวข้องโดยตรงกับคำถามของคุณในฐานข้อมูล ณ ขณะนี้"
-            else: # Context was found, but LLM didn't generate a meaningful answer
-                processed_answer = "ข้อมูลที่มีอยู่อาจไม่เพียงพอที่จะให้คำตอบที่ชัดเจนสำหรับคำถามนี้ค่ะ/ครับ"
-
-        final_answer_with_disclaimer = f"{processed_answer}\\n\\n{disclaimer_text}"
-
-        # If no relevant documents were found, reflect this in the answer more clearly if not already handled
-        if not results["documents"] or not results["documents"][0]:
-            # Override answer if RAG found nothing, ensuring it aligns with prompt instructions for no info
-            final_answer_with_disclaimer = f"ขออภัยค่ะ/ครับ ดิฉันไม่พบข้อมูลที่เกี่ยวข้องโดยตรงกับคำถามของคุณในฐานข้อมูล ณ ขณะนี้\\n\\n{disclaimer_text}"
-            sources = [] # Ensure sources are empty if RAG found nothing
-
         return {
-            "answer": final_answer_with_disclaimer,
+            "answer_stream": stream_llm_answer(prompt),
             "sources": sources
         }
     except Exception as e:
         print(f"Error in RAG query: {e}")
-        # Return a generic error message with disclaimer
-        error_disclaimer = "ข้อมูลนี้เป็นเพียงข้อมูลเบื้องต้นที่สรุปจากกระทู้ถามตอบในฟอรั่ม Agnos Health และไม่สามารถใช้แทนคำแนะนำ การวินิจฉัย หรือการรักษาจากแพทย์ผู้เชี่ยวชาญได้ หากคุณมีข้อกังวลด้านสุขภาพ กรุณาปรึกษาแพทย์โดยตรงนะคะ/ครับ"
+        # Return a generic error message; finalize_answer adds the disclaimer
         return {
-            "answer": f"เกิดข้อผิดพลาดในการประมวลผลคำถามของคุณ: {str(e)}\\n\\n{error_disclaimer}",
+            "answer_stream": _single_chunk_stream(f"เกิดข้อผิดพลาดในการประมวลผลคำถามของคุณ: {str(e)}"),
             "sources": []
-        } 
\ No newline at end of file
+        }